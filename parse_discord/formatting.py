@@ -1,62 +1,87 @@
 """Implementation of `Markup.__str__`. Not exported."""
 
+import re
+
 import regex
 
 from .ast import *
 from .ast import Mention
 
+escape_regex = regex.compile(r"([*_<@:[`\\\p{Emoji_Presentation}]|\|\||~~)")
+# no ASCII character is Emoji_Presentation, so ASCII text can be escaped without the regex
+ascii_escapes = str.maketrans({c: "\\" + c for c in "*_<@:[`\\"})
+word_start_regex = re.compile("[a-zA-Z0-9_]")
+lone_backtick_regex = re.compile("(?<!`)`(?!`)")
+
+# italics are handled separately, as their delimiter depends on the next node
+style_delimiters = {Bold: "**", Underline: "__", Strikethrough: "~~", Spoiler: "||"}
+mention_symbols = {UserMention: "@", ChannelMention: "#", RoleMention: "@&"}
+
+
+def lookup_type(table: dict[type, str], ty: type) -> str | None:
+    """Look a node type up in a table keyed by library types, falling back to the types it inherits from for subclasses."""
+    for base in ty.__mro__:
+        if (r := table.get(base)) is not None:
+            return r
+    return None
+
+def escape(t: str) -> str:
+    if not t.isascii():
+        return escape_regex.sub(r"\\\1", t)
+    # translate goes first so it doesn't escape the backslashes added in front of || and ~~
+    return t.translate(ascii_escapes).replace("||", "\\||").replace("~~", "\\~~")
 
 def indent(m: str, w: str) -> str:
-    return "".join(f"{w}{x}\n" for x in m.split("\n"))
+    return w + m.replace("\n", "\n" + w) + "\n"
 
-def format_markup(markup: Markup, *, escapes: bool = True) -> str:
-    def recur(markup: Markup) -> str:
-        return format_markup(markup, escapes=escapes)
+def format_link_text(markup: Markup) -> str:
+    return format_markup(markup, escapes=False)
 
+def format_child(markup: Markup) -> str:
+    # reuses the string str() kept on the markup if there is one, but doesn't keep one itself,
+    # as storing a string for every level would hold on to each character once per level it's nested in
+    s = markup._str
+    return s if s is not None else format_markup(markup)
+
+def format_markup(markup: Markup, *, escapes: bool = True) -> str:
+    render = format_child if escapes else format_link_text
     nodes = markup.nodes
 
-    out = ""
+    parts: list[str] = []
     for idx, node in enumerate(nodes):
         is_middle = idx != len(nodes)-1
         nxt = nodes[idx+1] if is_middle else None
-        def middled(s):
-            return s if is_middle else s[:-1]
+        # block elements end in a newline, which is dropped for the last node
+        cut = None if is_middle else -1
 
         match node:
             case Text(t):
                 # when inside a [text](url) link (escapes = False), escapes don't work at all, so don't insert them
-                out += regex.sub(r"([*_<@:[`\\\p{Emoji_Presentation}]|\|\||~~)", r"\\\1", t) if escapes else t
+                parts.append(escape(t) if escapes else t)
             case Header(b, n):
-                out += middled(f"{'#'*n} {recur(b)} #\n")
+                parts.extend(("#"*n, " ", render(b), " #\n"[:cut]))
             case Subtext(b):
-                out += middled(f"-# {recur(b)}\n")
+                parts.extend(("-# ", render(b), "\n"[:cut]))
             case Quote(b):
-                out += middled(indent(recur(b), "> "))
+                parts.append(indent(render(b), "> ")[:cut])
             case Style(b):
-                match node:
-                    case Bold():
-                        outer = "**"
-                    case Italic():
-                        # in general, _ is much more sensible than * and works without issue in most contexts.
-                        # however, it doesn't work if the closing _ is followed by an alphanumeric character,
-                        # so we must use * in these cases instead.
-                        match nxt:
-                            case Text(t) if regex.match("[a-zA-Z0-9_]", t):
-                                outer = "*"
-                            case _:
-                                outer = "_"
-                    case Underline():
-                        outer = "__"
-                    case Strikethrough():
-                        outer = "~~"
-                    case Spoiler():
-                        outer = "||"
-                    case _:
-                        assert False
-                out += f"{outer}{recur(b)}{outer}"
+                outer = lookup_type(style_delimiters, type(node))
+                if outer is None:
+                    assert isinstance(node, Italic)
+                    # in general, _ is much more sensible than * and works without issue in most contexts.
+                    # however, it doesn't work if the closing _ is followed by an alphanumeric character,
+                    # so we must use * in these cases instead.
+                    match nxt:
+                        case Text(t) if word_start_regex.match(t):
+                            outer = "*"
+                        case _:
+                            outer = "_"
+                parts.extend((outer, render(b), outer))
             case List(s, bs):
                 bullet = f"{s}. " if s else "- "
-                out += middled("".join(f"{bullet}{indent(recur(b), ' '*len(bullet))[len(bullet):]}" for b in bs))
+                width = len(bullet)
+                pad = " " * width
+                parts.append("".join(f"{bullet}{indent(render(b), pad)[width:]}" for b in bs)[:cut])
             case Link(target=l, inner=b, title=t, suppressed=s):
                 url = f"<{l}>" if s else l
                 # odd edge case
@@ -71,35 +96,28 @@ def format_markup(markup: Markup, *, escapes: bool = True) -> str:
                         url = url.removesuffix("/")
                 if t:
                     url += f' "{t}"'
-                out += f"[{format_markup(b, escapes=False)}]({url})" if b else url
+                if b:
+                    parts.extend(("[", format_link_text(b), "](", url, ")"))
+                else:
+                    parts.append(url)
             case InlineCode(c):
-                outer = "``" if regex.search("(?<!`)`(?!`)", c) else "`"
-                start = " " * c.lstrip(" ").startswith("`")
-                end = " " * c.rstrip(" ").endswith("`")
-                out += f"{outer}{start}{c}{end}{outer}"
+                outer = "``" if lone_backtick_regex.search(c) else "`"
+                start = " " if c.lstrip(" ").startswith("`") else ""
+                end = " " if c.rstrip(" ").endswith("`") else ""
+                parts.extend((outer, start, c, end, outer))
             case Codeblock(l, c):
                 l = l or ""
-                out += f"```{l}\n{c}\n```"
+                parts.extend(("```", l, "\n", c, "\n```"))
             case Mention(i):
-                match node:
-                    case UserMention():
-                        symbol = "@"
-                    case ChannelMention():
-                        symbol = "#"
-                    case RoleMention():
-                        symbol = "@&"
-                    case _:
-                        assert False
-                out += f"<{symbol}{i}>"
+                parts.append(f"<{lookup_type(mention_symbols, type(node))}{i}>")
             case Timestamp(t, f):
-                form = f":{f}" * (f != "f")
-                out += f"<t:{t}{form}>"
+                parts.append(f"<t:{t}:{f}>" if f != "f" else f"<t:{t}>")
             case UnicodeEmoji(t):
-                out += t
+                parts.append(t)
             case CustomEmoji(i, n, a):
-                out += f"<{'a'*a}:{n}:{i}>"
+                parts.append(f"<{'a' if a else ''}:{n}:{i}>")
             case Everyone():
-                out += "@everyone"
+                parts.append("@everyone")
             case Here():
-                out += "@here"
-    return out
+                parts.append("@here")
+    return "".join(parts)
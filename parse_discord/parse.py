@@ -2,11 +2,9 @@
 
 from __future__ import annotations
 
-import copy
-import datetime
 import functools
-from enum import Enum
-from typing import Generator, Any
+import re
+from typing import Callable
 from pathlib import Path
 
 import regex
@@ -15,10 +13,12 @@ from .ast import *
 from .string import text_to_url, clean_whitespace, is_link_admissable
 
 
-__all__ = ("parse",)
+__all__ = ("parse", "precompile")
 
-with open(Path(__file__).parent / "emoji.txt") as f:
-    emoji_source = f.read()
+@functools.cache
+def emoji_source() -> str:
+    """The pattern matching every Unicode emoji, read on first use so that importing doesn't touch the file."""
+    return (Path(__file__).parent / "emoji.txt").read_text()
 
 bold_underline_source = r"""
  \*\*(?<b>(?:\\.|[^\\])+?)\*\*(?!\*)  # bold
@@ -44,21 +44,24 @@ allowed_in_links_source = r"""
 
 # emoji
 | <(?<cea>a?):(?<cen>[a-zA-Z_0-9]+):(?<ce>[0-9]+)>
-| (?<ue>%s)  # substituted with emoji_source below
+| (?<ue>%%s)  # substituted with emoji_source() when compiling
 
 # time
 | <t:(?<t>-?[0-9]+)(?::(?<tf>[tTdDfFR]))?>
-""" % (bold_underline_source, emoji_source)
+""" % (bold_underline_source,)
 
 main_source = r"""
 # skip escapes
 {{??escapes(?:\\.(*SKIP)(*F))?}}
 
-# codeblock
+# codeblock. optional like the rules at the bottom, but it has to come first to take precedence over inline code
+{{??codeblocks
   ```(?:(?<Cl>[a-zA-Z_\-+.0-9]*)\n)?(?<C>.*?[^\n].*?)```
+|
+}}
 
 # substituted with allowed_in_links_source below
-| %s
+  %s
 
 # mentions
 | <@!?(?<um>[0-9]+)>
@@ -73,7 +76,7 @@ main_source = r"""
 
 # [text](url "title") links
 | \[(?<Lb>(?:\[[^\]]*\]|[^\[\]])*[^\[]*)\]  # text part
-  \(\s*
+  \((?=[^)]*\))\s*  # the closing paren has to exist somewhere. checking first avoids a quadratic search when it doesn't
     (?<Ls><)?(?<L>(?:\([^)]*\)|[^\s\\]|\\[^\n])*?)(?<Ls>>)?  # url part
     (?:\s+['"](?<Lt>.*?)['"])?  # title part
   \s*\)
@@ -99,20 +102,67 @@ main_source = r"""
 
 FLAGS = regex.X | regex.S | regex.M | regex.VERSION1
 
-@functools.cache
-def compiled_regex(**kwargs: bool) -> regex.Pattern:
+# the {{??name ...}} fences in main_source. bit n of a variant's index says whether optional_rules[n] is enabled
+optional_rules = ("headers", "quotes", "lists", "escapes", "codeblocks")
+# compiled on first use, as each variant takes a while to compile and most programs only ever need a few of them.
+# each takes about 20-35ms, so a program that happens to need all 32 spends nearly a second compiling them over its first parses.
+# `precompile` moves that cost up front
+variants: list[regex.Pattern | None] = [None] * 2**len(optional_rules)
+
+def compiled_regex(index: int) -> regex.Pattern:
+    if r := variants[index]:
+        return r
     s = main_source
-    for name, value in kwargs.items():
-        s = regex.sub(r"\{\{\?\?%s\b(.*?)}}" % name, r"\1" if value else "", s, flags=regex.S)
-    return regex.compile(s, FLAGS)
+    for bit, name in enumerate(optional_rules):
+        s = re.sub(r"\{\{\?\?%s\b(.*?)}}" % name, r"\1" if index >> bit & 1 else "", s, flags=re.S)
+    r = variants[index] = regex.compile(s % emoji_source(), FLAGS)
+    return r
+
+@functools.cache
+def allowed_in_links_compiled() -> regex.Pattern:
+    return regex.compile(allowed_in_links_source % emoji_source(), FLAGS)
+
+def precompile() -> None:
+    """Compile every pattern the parser can use ahead of time.
+
+    Otherwise, each pattern is compiled the first time a string needs it, which makes those calls to `parse` slower.
+    Compiling all of them takes around a second, so this is best called at startup by programs that care about the latency of individual parses.
+    """
+    for index in range(len(variants)):
+        compiled_regex(index)
+    allowed_in_links_compiled()
 
 bold_underline_compiled = regex.compile(bold_underline_source, FLAGS)
-allowed_in_links_compiled = regex.compile(allowed_in_links_source, FLAGS)
 
-class LineStart(Enum):
-    NOTHING = 0
-    SPACE = 1
-    TEXT = 2
+# strips the backslashes from escapes and trailing spaces from lines in plain text
+unescape_regex = regex.compile(r"(?|\\([^A-Za-z0-9\s])|(¯\\_\(ツ\)_/¯))| +(?=\n)")
+link_unescape_regex = regex.compile(r"\\([^a-zA-Z0-9\s])")
+
+def strip_list_indent(item: str, width: int) -> str:
+    """Removes the indentation that a bullet `width` characters wide allows from each line of its item."""
+    return "\n".join(line[min(width, len(line) - len(line.lstrip(" "))):] for line in item.split("\n"))
+
+# ASCII text matching none of these can't contain any markup, in any context
+markup_hint_regex = re.compile(r"[*_~|`<>#@\-\\\[:]| \n|[0-9]\.")
+
+def plain_markup(s: str) -> Markup | None:
+    """The result of parsing `s` if it is plain text that doesn't need to go through the main regex at all, otherwise `None`."""
+    if s.isascii() and not markup_hint_regex.search(s):
+        return Markup([Text(s)]) if s else EMPTY_MARKUP
+    return None
+
+# nodes that are chosen entirely by which group matched. that group is always the last one to close, so it is `m.lastgroup`
+style_groups = {"b": Bold, "u": Underline, "i": Italic, "s": Strikethrough, "S": Spoiler}
+mention_groups = {"um": UserMention, "cm": ChannelMention, "rm": RoleMention}
+
+# how deeply styles can nest before any further ones are left as text. each level scans the whole rest of its string for a closing
+# delimiter, so without a limit, runs like `"*" * 4000` take time quadratic in their length
+MAX_STYLE_DEPTH = 100
+
+# values of Context.line_start. plain ints, as they are compared on every parse
+LINE_NOTHING = 0
+LINE_SPACE = 1
+LINE_TEXT = 2
 
 class Context:
     """Context about the contents of the source string surrounding a regex being matched.
@@ -125,187 +175,293 @@ class Context:
     issues around context. Its `parse` method renders this information to "pass" it to
     the main regex using a variety of tricks.
 
-    :ivar LineStart line_start: Info about the preceding text on the current line.
+    :ivar int line_start: Info about the preceding text on the current line.
         One of:
-        - `NOTHING`: This is the start of the line.
-        - `SPACE`: There are only spaces preceding the node.
-        - `TEXT`: The node is in the middle of a line.
+        - `LINE_NOTHING`: This is the start of the line.
+        - `LINE_SPACE`: There are only spaces preceding the node.
+        - `LINE_TEXT`: The node is in the middle of a line.
     :ivar bool is_quote: Whether the node is inside a quote.
     :ivar int list_depth: The current level of list nesting, from 0 (not in a list) to 11.
+    :ivar int style_depth: The current level of style nesting, from 0 (not in a style) to `MAX_STYLE_DEPTH`.
     :ivar bool testing_link: Whether the node is being tested by is_link_admissable.
     :ivar bool is_link: Whether the node is inside the text part of a [text](url) link.
     """
 
+    __slots__ = ("line_start", "is_quote", "list_depth", "style_depth", "testing_link", "is_link")
+
     def __init__(self,
-        line_start: LineStart = LineStart.NOTHING,
+        line_start: int = LINE_NOTHING,
         is_quote: bool = False,
         list_depth: int = 0,
+        style_depth: int = 0,
         testing_link: bool = False,
         is_link: bool = False,
     ):
         self.line_start = line_start
         self.is_quote = is_quote
         self.list_depth = list_depth
+        self.style_depth = style_depth
         self.testing_link = testing_link
         self.is_link = is_link
 
     def update(self, s: str, m: regex.Match, *,
         is_quote: bool = False,
         is_list: bool = False,
+        is_style: bool = False,
         testing_link: bool = False,
     ) -> Context:
-        line_start = LineStart.NOTHING
         i = m.start()
-        while True:
-            i -= 1
-            if i < 0 or s[i] == "\n":
-                break
-            if s[i] != " ":
-                line_start = LineStart.TEXT
-                break
-            line_start = LineStart.SPACE
+        # look at the character before the match first, which settles the common cases without any scanning
+        c = s[i-1] if i else "\n"
+        if c == "\n":
+            line_start = LINE_NOTHING
+        elif c != " ":
+            line_start = LINE_TEXT
+        elif s[s.rfind("\n", 0, i)+1:i].strip(" "):
+            line_start = LINE_TEXT
+        else:
+            line_start = LINE_SPACE
 
         return Context(
             line_start,
             self.is_quote or is_quote,
             self.list_depth + is_list,
+            self.style_depth + is_style,
             self.testing_link or testing_link,
             self.is_link,
         )
 
     def parse(self, s: str) -> Markup:
+        return self.parser(s).parse()
+
+    def parser(self, s: str) -> Parser:
         if self.is_link:
-            return Parser(allowed_in_links_compiled, s, 0, self).parse()
+            return Parser(allowed_in_links_compiled(), s, 0, self)
 
-        if self.line_start == LineStart.NOTHING:
+        if self.line_start == LINE_NOTHING:
             start = ""
-        elif self.line_start == LineStart.SPACE:
+        elif self.line_start == LINE_SPACE:
             start = " "
         else:
             start = "$"
         i = len(start)
         s = start + s
+        # rules whose marker doesn't appear in the string at all are left out too, which makes for a smaller pattern to scan with
         r = compiled_regex(
-            headers=not self.list_depth,
-            quotes=not self.is_quote,
-            lists=self.list_depth < 11,
-            escapes=not self.testing_link,
+            (not self.list_depth and "#" in s)
+            | (not self.is_quote and ">" in s) << 1
+            | (self.list_depth < 11 and ("-" in s or "*" in s or "." in s)) << 2
+            | (not self.testing_link) << 3
+            | ("```" in s) << 4
         )
-        return Parser(r, s, i, self).parse()
+        return Parser(r, s, i, self)
+
+# a node that can only be built once some child markups have been parsed: the function building it, and the parsers for the children.
+# children that are plain text are already parsed, and are given as the finished `Markup` instead
+Pending = tuple[Callable[..., Node], list["Parser | Markup"]]
 
 class Parser:
+    """Parses a single string into a `Markup`.
+
+    Nested markup is parsed by child parsers that are run from an explicit stack in `parse`, so arbitrarily deep trees don't
+    recurse in Python. While waiting on its children, a parser stores the pending node's builder, the child parsers left to run,
+    and the results so far.
+    """
+
+    __slots__ = ("regex", "s", "i", "ctx", "nodes", "build", "pending", "results")
+
     def __init__(self, regex: regex.Pattern, s: str, i: int, ctx: Context):
         self.regex = regex
         self.s = s
         self.i = i
         self.ctx = ctx
         self.nodes = []
+        self.build = None
+        self.pending = []
+        self.results = []
 
     def advance(self, start: int, end: int):
         t = self.s[self.i:start]
         self.i = end
         if t:
-            if not (self.ctx.testing_link or self.ctx.is_link):
-                t = regex.sub(r"(?|\\([^A-Za-z0-9\s])|(¯\\_\(ツ\)_/¯))| +(?=\n)", r"\1", t)
+            # the unescape regex can only change text with a backslash or a space before a newline in it
+            if not (self.ctx.testing_link or self.ctx.is_link) and ("\\" in t or " \n" in t):
+                t = unescape_regex.sub(r"\1", t)
             self.nodes.append(Text(t))
 
     def parse(self) -> Markup:
-        while n := self.get_match():
-            self.nodes.append(n)
+        stack = [self]
+        while True:
+            p = stack[-1]
+            if child := p.step():
+                stack.append(child)
+                continue
+            stack.pop()
+            m = p.finish()
+            if not stack:
+                return m
+            stack[-1].results.append(m)
+
+    def step(self) -> Parser | None:
+        """Consume matches until a child markup needs to be parsed, returning its parser, or `None` when the string is exhausted."""
+        while True:
+            while self.pending:
+                child = self.pending.pop()
+                if type(child) is not Markup:
+                    return child
+                self.results.append(child)
+            if self.build is not None:
+                self.nodes.append(self.build(*self.results))
+                self.build = None
+                self.results = []
+            n = self.get_match()
+            if n is None:
+                return None
+            if type(n) is not tuple:
+                self.nodes.append(n)
+                continue
+            self.build, children = n
+            children.reverse()
+            self.pending = children
+
+    def finish(self) -> Markup:
         self.advance(len(self.s), 0)
+        if not self.nodes:
+            return EMPTY_MARKUP
         return Markup(self.nodes)
 
     def new_ctx(self, m: regex.Match, **kwargs) -> Context:
         return self.ctx.update(self.s, m, **kwargs)
 
-    def get_match(self) -> Node | None:
+    def child(self, m: regex.Match, s: str, **kwargs) -> Parser | Markup:
+        return plain_markup(s) or self.new_ctx(m, **kwargs).parser(s)
+
+    def get_match(self) -> Node | Pending | None:
         m = self.regex.search(self.s, self.i)
 
         if m is None:
             return m
 
-        # bold and underline matches take precedence over shorter italic ones
-        if m.group("i"):
-            if nm := bold_underline_compiled.match(self.s, m.start()):
-                if len(range(*nm.span())) > len(range(*m.span())):
-                    m = nm
-
-        self.advance(m.start(), m.end())
-
-        for g, ty in [("b", Bold), ("u", Underline), ("i", Italic), ("s", Strikethrough), ("S", Spoiler)]:
-            if r := m.group(g):
-                return ty(self.new_ctx(m).parse(r))
-
-        for g, ty in [("um", UserMention), ("cm", ChannelMention), ("rm", RoleMention)]:
-            if r := m.groupdict().get(g):
-                return ty(int(r))
-
-        for g, ty in [("em", Everyone), ("hm", Here)]:
-            if r := m.groupdict().get(g):
-                return ty()
-
-        if r := m.group("c"):
-            s = r.strip(" ")
-            if s.startswith("`"):
-                r = r.removeprefix(" ")
-            if s.endswith("`"):
-                r = r.removesuffix(" ")
-            return InlineCode(r) if not self.ctx.testing_link else Style(self.new_ctx(m).parse(r))
-
-        if r := m.groupdict().get("C"):
-            return Codeblock(m.group("Cl") or None, r.strip("\n"))
-
-        if r := m.group("ce"):
-            return CustomEmoji(int(r), m.group("cen"), bool(m.group("cea")))
-
-        if r := m.group("ue"):
-            return UnicodeEmoji(r)
-
-        if r := m.group("t"):
-            limit = 8_640_000_000_000
-            timestamp = int(r)
-            if not -limit <= timestamp <= limit:
-                return Text(m[0])
-            return Timestamp(timestamp, m.group("tf") or "f")
-
-        if r := m.group("v"):
-            return Subtext(self.new_ctx(m).parse(r))
-
-        if r := m.groupdict().get("l"):
-            if (len(r) - len(r.rstrip(")"))) > r.count("("):
-                self.i -= 1
-                r = r[:-1]
-            if not (u := text_to_url(r)):
-                return Text(r)
-            return Link(u, None, None, m.group("ls") is not None)
-
-        if r := m.groupdict().get("L"):
-            url = text_to_url(regex.sub(r"\\([^a-zA-Z0-9\s])", r"\1", r))
-            body = m.group("Lb")
-            title = m.group("Lt")
-            ctx = self.new_ctx(m, testing_link=True)
-            if not url or not is_link_admissable(ctx, body, allow_emoji=False) or title and is_link_admissable(ctx, title, allow_emoji=True) is None:
-                return Text(m[0])
-            inner = Context(is_link=True).parse(clean_whitespace(body))
-            return Link(url, inner, title and clean_whitespace(title), bool(m.captures("Ls")))
-
-        if r := m.capturesdict().get("q"):
-            return Quote(self.new_ctx(m, is_quote=True).parse("\n".join(r)))
+        start, end = m.span()
+        g = m.lastgroup
 
-        if r := m.capturesdict().get("li"):
-            items = []
-            bullets = m.captures("lb")
-            start = None if bullets[0].strip() in "*-" else min(max(int(bullets[0].split(".")[0]), 1), 1_000_000_000)
-            for bullet, item in zip(bullets, r):
-                t = regex.sub("^ {1,%d}" % len(bullet), "", item, flags=regex.M)
-                items.append(self.new_ctx(m, is_list=True).parse(t))
-            return List(start, items)
+        # bold and underline matches take precedence over shorter italic ones
+        # (both start at the same place, so comparing ends is enough, and only a doubled delimiter can start one)
+        if g == "i" and self.s.startswith(self.s[start] * 2, start):
+            if (nm := bold_underline_compiled.match(self.s, start)) and nm.end() > end:
+                m = nm
+                end = m.end()
+                g = m.lastgroup
 
-        if r := m.groupdict().get("h"):
-            title = r.rstrip().rstrip("#").rstrip()
-            return Header(self.new_ctx(m).parse(title), len(m.group("hn")))
+        self.advance(start, end)
 
-        assert False
+        if ty := style_groups.get(g):
+            if self.ctx.style_depth >= MAX_STYLE_DEPTH:
+                return Text(m[0])
+            return ty, [self.child(m, m[g], is_style=True)]
+        if ty := mention_groups.get(g):
+            return ty(int(m[g]))
+        if g == "em":
+            return Everyone()
+        if g == "hm":
+            return Here()
+
+        return self.handlers[g](self, m)
+
+    def inline_code(self, m: regex.Match) -> Node | Pending:
+        r = m["c"]
+        s = r.strip(" ")
+        if s.startswith("`"):
+            r = r.removeprefix(" ")
+        if s.endswith("`"):
+            r = r.removesuffix(" ")
+        return InlineCode(r) if not self.ctx.testing_link else (Style, [self.child(m, r)])
+
+    def codeblock(self, m: regex.Match) -> Node:
+        return Codeblock(m["Cl"] or None, m["C"].strip("\n"))
+
+    def custom_emoji(self, m: regex.Match) -> Node:
+        return CustomEmoji(int(m["ce"]), m["cen"], bool(m["cea"]))
+
+    def unicode_emoji(self, m: regex.Match) -> Node:
+        return UnicodeEmoji(m["ue"])
+
+    def timestamp(self, m: regex.Match) -> Node:
+        limit = 8_640_000_000_000
+        timestamp = int(m["t"])
+        if not -limit <= timestamp <= limit:
+            return Text(m[0])
+        return Timestamp(timestamp, m["tf"] or "f")
+
+    def subtext(self, m: regex.Match) -> Pending:
+        r = m["v"]
+        # like the header text and the masked link URL, this can be empty, which has never been handled
+        assert r
+        return Subtext, [self.child(m, r)]
+
+    def link(self, m: regex.Match) -> Node:
+        r = m["l"]
+        if (len(r) - len(r.rstrip(")"))) > r.count("("):
+            self.i -= 1
+            r = r[:-1]
+        if not (u := text_to_url(r)):
+            return Text(r)
+        return Link(u, None, None, m["ls"] is not None)
+
+    def masked_link(self, m: regex.Match) -> Node:
+        r = m["L"]
+        assert r
+        url = text_to_url(link_unescape_regex.sub(r"\1", r))
+        body = m["Lb"]
+        title = m["Lt"]
+        ctx = self.new_ctx(m, testing_link=True)
+        if not url or not is_link_admissable(ctx, body, allow_emoji=False) or title and is_link_admissable(ctx, title, allow_emoji=True) is None:
+            return Text(m[0])
+        inner = Context(style_depth=self.ctx.style_depth, is_link=True).parse(clean_whitespace(body))
+        return Link(url, inner, title and clean_whitespace(title), bool(m.captures("Ls")))
+
+    def quote(self, m: regex.Match) -> Pending:
+        r = m[0]
+        if r.startswith(">>>"):
+            r = r[4:]
+        else:
+            # every line of the match is "> " and its content, and contents can't contain newlines
+            r = r.removesuffix("\n")[2:].replace("\n> ", "\n")
+        return Quote, [self.child(m, r, is_quote=True)]
+
+    def bullet_list(self, m: regex.Match) -> Pending:
+        items = []
+        bullets = m.captures("lb")
+        start = None if bullets[0].strip() in "*-" else min(max(int(bullets[0].partition(".")[0]), 1), 1_000_000_000)
+        for bullet, item in zip(bullets, m.captures("li")):
+            t = strip_list_indent(item, len(bullet))
+            items.append(self.child(m, t, is_list=True))
+        return lambda *items: List(start, items), items
+
+    def header(self, m: regex.Match) -> Pending:
+        r = m["h"]
+        assert r
+        title = r.rstrip().rstrip("#").rstrip()
+        level = len(m["hn"])
+        return lambda inner: Header(inner, level), [self.child(m, title)]
+
+    # every other kind of match, keyed by `m.lastgroup`. optional groups that can close after the main one map to the same handler
+    handlers = {
+        "c": inline_code,
+        "C": codeblock,
+        "ce": custom_emoji,
+        "ue": unicode_emoji,
+        "t": timestamp,
+        "tf": timestamp,
+        "v": subtext,
+        "l": link,
+        "L": masked_link,
+        "Ls": masked_link,
+        "Lt": masked_link,
+        "q": quote,
+        "li": bullet_list,
+        "h": header,
+    }
 
 def parse(string: str, /) -> Markup:
     """Parse a string.
@@ -316,4 +472,5 @@ def parse(string: str, /) -> Markup:
     :param string: The string to parse.
     :returns: The resulting tree.
     """
-    return Context().parse(string)
+    # most messages are plain text
+    return plain_markup(string) or Context().parse(string)
@@ -6,16 +6,17 @@ from typing import Iterator, TYPE_CHECKING
 
 import regex
 
-from urlstd.parse import URL
-
 from .ast import *
 
 if TYPE_CHECKING:
+    from urlstd.parse import URL
     from .parse import Context
 
 
 def text_to_url(s: str) -> URL | None:
     """Parse a string as a WHATWG URL, returning None if the URL is invalid or the scheme is not allowed by Discord."""
+    # urlstd loads ICU, which is by far the slowest part of importing this package, so wait until a link needs it
+    from urlstd.parse import URL
     if not URL.can_parse(s):
         return None
     u = URL(s)
@@ -23,12 +24,17 @@ def text_to_url(s: str) -> URL | None:
         return None
     return u
 
-def url_to_text(url: URL) -> str:
-    """Convert a WHATWG URL to a string."""
+def url_to_text(url: URL, *, credentials: bool = True) -> str:
+    """Convert a WHATWG URL to a string. If `credentials` is false, the username and password are left out."""
     if url.origin ==  "null" and url.pathname.startswith("//"):
         s = url.protocol
     else:
-        t = "".join([url.username, *[":", url.password]*bool(url.password), "@"]*bool(url.username))
+        if not (credentials and url.username):
+            t = ""
+        elif url.password:
+            t = f"{url.username}:{url.password}@"
+        else:
+            t = f"{url.username}@"
         s = f"{url.protocol}//{t}{url.host}"
     return f"{s}{url.pathname}{url.search}{url.hash}"
 
@@ -38,8 +44,13 @@ bad_whitespace_regex = regex.compile(r"""
 |\N{HANGUL JUNGSEONG FILLER}|\N{HANGUL FILLER}|\N{HALFWIDTH HANGUL FILLER}
 """, regex.VERBOSE)
 
+# the only characters in ASCII that bad_whitespace_regex matches are the control characters other than \n
+ascii_bad_whitespace_table = dict.fromkeys([*range(10), *range(11, 32), 127])
+
 def clean_whitespace(s: str) -> str:
     """Remove "special" whitespace characters from a string."""
+    if s.isascii():
+        return s.translate(ascii_bad_whitespace_table)
     return bad_whitespace_regex.sub("", s)
 
 confusables = {
@@ -66,29 +77,30 @@ def has_special_link(s: str) -> bool:
     # TODO: fix stub
     return False
 
-def _is_link_admissable(m: Markup, *, allow_emoji: bool) -> bool | None:
-    allowed = [Text, Underline, Bold, Italic, Strikethrough, InlineCode, Spoiler, Timestamp, List, Header, Quote]
-    if allow_emoji:
-        allowed += [UnicodeEmoji, CustomEmoji]
+# the node types Discord allows in the text of a [text](url) link. the styles among them are checked recursively
+link_styles = frozenset({Underline, Bold, Italic, Strikethrough, Spoiler, Header, Quote})
+link_leaves = frozenset({InlineCode, Timestamp, List})
+link_emoji = frozenset({UnicodeEmoji, CustomEmoji})
 
+def _is_link_admissable(m: Markup, *, allow_emoji: bool) -> bool | None:
     # we can't use {meth}`walk` because the AST walk Discord does for their equivalent of this function
     # fails to go into lists. whoops!
     has_text = False
     for node in m.nodes:
-        if type(node) == Style:
+        ty = type(node)
+        if ty is Text:
+            # the rest of the nodes still have to be checked for disallowed ones, but once there's text, text doesn't matter
+            r = has_text or not node.text.isspace()
+        elif ty is Style:
             # the type being exactly Style means that this is a dummy node representing
             # an inline code block, so force-allow emoji when recursing
             r = _is_link_admissable(node.inner, allow_emoji=True)
-        elif type(node) not in allowed:
-            return None
+        elif ty in link_styles:
+            r = _is_link_admissable(node.inner, allow_emoji=allow_emoji)
+        elif ty in link_leaves or allow_emoji and ty in link_emoji:
+            r = True
         else:
-            match node:
-                case Style(b):
-                    r = _is_link_admissable(b, allow_emoji=allow_emoji)
-                case Text(t):
-                    r = not t.isspace()
-                case _:
-                    r = True
+            return None
         if r is None:
             return None
         has_text = has_text or r
@@ -12,3 +12,4 @@ from .emoji import *
 from .lists import *
 from .links import *
 from .formatting import *
+from .nodes import *
@@ -1,3 +1,4 @@
+import timeit
 import unittest
 
 from parse_discord import *
@@ -50,22 +51,44 @@ class Asterisks(unittest.TestCase):
 
     def test_n_on_right(self):
         for i in range(20):
-            p = parse(f"*foo****{'*'*i}")
-            if i % 2:
-                self.assertIsInstance(p.nodes[0], Italic)
-                inner = p.nodes[0].inner.nodes  # type: ignore
-                self.assertEqual(inner[0], Text("foo"))
-                self.assertEqual(depth_of_insanity(inner[1]), i//2 + 1)
-            else:
-                self.assertEqual(p.nodes[0], Text("*foo"))
-                self.assertEqual(depth_of_insanity(p.nodes[1]), i//2 + 1)
+            with self.subTest(i=i):
+                p = parse(f"*foo****{'*'*i}")
+                if i % 2:
+                    self.assertIsInstance(p.nodes[0], Italic)
+                    inner = p.nodes[0].inner.nodes  # type: ignore
+                    self.assertEqual(inner[0], Text("foo"))
+                    self.assertEqual(depth_of_insanity(inner[1]), i//2 + 1)
+                else:
+                    self.assertEqual(p.nodes[0], Text("*foo"))
+                    self.assertEqual(depth_of_insanity(p.nodes[1]), i//2 + 1)
                 
     def test_n(self):
         for i in range(20):
-            p = parse("*"*(i+1))
-            nth, part = divmod(i, 4)
-            self.assertEqual(depth_of_insanity(p.nodes[0]), nth*2+(part//2%2) if part%2 else nth)
-            self.assertIsInstance(p.nodes[0], (Text, Italic if part%2 else Bold))
+            with self.subTest(i=i):
+                p = parse("*"*(i+1))
+                nth, part = divmod(i, 4)
+                self.assertEqual(depth_of_insanity(p.nodes[0]), nth*2+(part//2%2) if part%2 else nth)
+                self.assertIsInstance(p.nodes[0], (Text, Italic if part%2 else Bold))
+
+    def test_n_deep(self):
+        # styles stop nesting at a fixed depth, and the delimiters past it are left as text
+        p = parse("*"*1200)
+        self.assertEqual(depth_of_insanity(p.nodes[0]), 100)
+        self.assertEqual(sum(type(n) is Italic for n in p.walk()), 100)
+
+    def test_n_linear(self):
+        # every level of nesting scans the rest of the string, so this is quadratic unless the nesting depth is bounded
+        for s in ("*", "**a"):
+            with self.subTest(s=s):
+                short, long = (min(timeit.repeat(lambda: parse(s * (n // len(s))), number=1, repeat=3)) for n in (2000, 4000))
+                self.assertLess(long, short * 3)
+
+    def test_n_deep_dunders(self):
+        p = parse("*"*200)
+        self.assertEqual(p, parse("*"*200))
+        self.assertEqual(hash(p), hash(parse("*"*200)))
+        str(p)
+        repr(p)
 
     def test_no_nest(self):
         self.assertEqual(parse("*a   *b*   c*"), Markup([Text("*a   "), Italic(Markup([Text("b")])), Text("   c*")]))
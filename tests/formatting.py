@@ -1,14 +1,35 @@
+import re
 import unittest
 import pathlib
-import regex
+from ast import literal_eval
 
 from parse_discord import *
 
 
+# the string literal passed to each parse() call in the test files
+literal_regex = re.compile(r'parse\((r?".*?")\)')
+
+def round_trip_cases():
+    for path in pathlib.Path(__file__).parent.glob("*.py"):
+        yield from map(literal_eval, literal_regex.findall(path.read_text()))
+
+
 class Formatting(unittest.TestCase):
     def test_round_trip(self):
-        cases = []
-        for path in pathlib.Path(__file__).parent.glob("*.py"):
-            cases.extend(map(eval, regex.findall(r'parse\((r?".*?")\)', path.read_text())))
-        for c in cases:
-            self.assertEqual(parse(c), parse(str(parse(c))), c)
+        for c in round_trip_cases():
+            p = parse(c)
+            self.assertEqual(p, parse(str(p)), c)
+
+    def test_subclass(self):
+        class MyBold(Bold):
+            __slots__ = ()
+
+        class MyItalic(Italic):
+            __slots__ = ()
+
+        class MyMention(UserMention):
+            __slots__ = ()
+
+        self.assertEqual(str(Markup([MyBold(Markup([Text("a")]))])), "**a**")
+        self.assertEqual(str(Markup([MyItalic(Markup([Text("a")]))])), "_a_")
+        self.assertEqual(str(Markup([MyMention(5)])), "<@5>")
@@ -1,3 +1,4 @@
+import functools
 import unittest
 
 from urlstd.parse import URL
@@ -5,8 +6,11 @@ from urlstd.parse import URL
 from parse_discord import *
 
 
+# the same few URLs come up over and over, and the tests never modify them
+parse_url = functools.cache(URL)
+
 def u(url, inner=None, title=None, suppressed=False):
-    return Link(URL(url), inner, title, suppressed)
+    return Link(parse_url(url), inner, title, suppressed)
 
 class Links(unittest.TestCase):
     def test_bare(self):
@@ -135,3 +139,13 @@ class Links(unittest.TestCase):
     def test_url_escaping(self):
         self.assertEqual(parse(r"https://a\$"), Markup([u("https:/a/$")]))
         self.assertEqual(parse(r"[a](https://b\$)"), Markup([u("https://b$", inner=Markup([Text("a")]))]))
+
+    def test_display_target(self):
+        self.assertEqual(u("https://user:pass@a/b?c#d").display_target, "https://a/b?c#d")
+        self.assertEqual(u("https://user@a").display_target, "https://a/")
+        self.assertEqual(u("https://a").display_target, "https://a/")
+        self.assertEqual(u("https://user:pass@a").target, "https://user:pass@a/")
+
+    def test_unclosed_many(self):
+        # used to take seconds
+        self.assertEqual(parse("[a](" * 1000), Markup([Text("[a](" * 1000)]))
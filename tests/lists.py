@@ -3,6 +3,11 @@ import unittest
 from parse_discord import *
 
 
+# lists nest 11 deep at most, so the last bullet stays as text
+max_nesting = Markup([Text("1. a")])
+for _ in range(11):
+    max_nesting = Markup([List(1, [max_nesting])])
+
 class Lists(unittest.TestCase):
     def test_asterisk_ul(self):
         self.assertEqual(parse("* foo"), Markup([List(None, [Markup([Text("foo")])])]))
@@ -28,34 +33,7 @@ class Lists(unittest.TestCase):
         self.assertEqual(parse("* \na"), Markup([List(None, [Markup([Text("\na")])])]))
 
     def test_nesting(self):
-        self.assertEqual(
-            parse("1. 1. 1. 1. 1. 1. 1. 1. 1. 1. 1. 1. a"),
-            Markup([
-                List(1, [Markup([
-                    List(1, [Markup([
-                        List(1, [Markup([
-                            List(1, [Markup([
-                                List(1, [Markup([
-                                    List(1, [Markup([
-                                        List(1, [Markup([
-                                            List(1, [Markup([
-                                                List(1, [Markup([
-                                                    List(1, [Markup([
-                                                        List(1, [Markup([
-                                                            Text("1. a"),
-                                                        ])])
-                                                    ])])
-                                                ])])
-                                            ])])
-                                        ])])
-                                    ])])
-                                ])])
-                            ])])
-                        ])])
-                    ])])
-                ])])
-            ])
-        )
+        self.assertEqual(parse("1. 1. 1. 1. 1. 1. 1. 1. 1. 1. 1. 1. a"), max_nesting)
 
     def test_multi(self):
         self.assertEqual(parse("0. a\n0. b"), Markup([List(1, [Markup([Text("a")]), Markup([Text("b")])])]))
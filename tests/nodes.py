@@ -0,0 +1,104 @@
+import unittest
+
+from parse_discord import *
+from parse_discord.ast import Mention
+
+
+class Nodes(unittest.TestCase):
+    def test_walk(self):
+        m = parse("a **b _c_** d\n- e\n- [f](https://g)")
+        self.assertEqual([type(n) for n in m.walk()], [Text, Bold, Text, Italic, Text, Text, List, Text, Link, Text])
+        self.assertEqual([n.text for n in m.walk() if isinstance(n, Text)], ["a ", "b ", "c", " d\n", "e", "f"])
+
+    def test_walk_subclass(self):
+        class Glow(Style):
+            __slots__ = ()
+
+        m = Markup([Glow(Markup([Codeblock("py", "x")]))])
+        self.assertEqual([type(n) for n in m.walk()], [Glow, Codeblock])
+
+    def test_shared(self):
+        self.assertIs(parse("@everyone").nodes[0], Everyone())
+        self.assertIs(parse("@here").nodes[0], Here())
+        self.assertIs(parse("*a* *b*").nodes[1], Text(" "))
+        self.assertIs(parse("🥺 🥺").nodes[2], UnicodeEmoji("🥺"))
+        self.assertIs(parse(""), EMPTY_MARKUP)
+
+    def test_hash(self):
+        self.assertEqual(hash(parse("[l](https://a)")), hash(parse("[l](https://a/)")))
+        self.assertEqual(len({parse("**a**"), parse("__a__"), parse("**a**")}), 2)
+
+    def test_replace(self):
+        h = Header(Markup([Text("a")]), 1)
+        self.assertEqual(h.__replace__(level=2), Header(Markup([Text("a")]), 2))
+        self.assertEqual(Markup([Text("a")]).__replace__(nodes=[Text("b")]), Markup([Text("b")]))
+        with self.assertRaises(TypeError):
+            h.__replace__(size=2)
+
+    def test_shared_subclass(self):
+        class Plain(Text):
+            __slots__ = ()
+
+        class Loud(Everyone):
+            __slots__ = ()
+
+        self.assertIs(type(Plain("a")), Plain)
+        self.assertIs(type(Text("a")), Text)
+        self.assertIs(type(parse("*a*").nodes[0].inner.nodes[0]), Text)
+        self.assertIs(type(Loud()), Loud)
+        self.assertIs(Loud(), Loud())
+        self.assertIs(type(Everyone()), Everyone)
+
+        class E(UnicodeEmoji):
+            __slots__ = ()
+
+        self.assertIs(type(E("🥺")), E)
+        self.assertIs(type(parse("🥺").nodes[0]), UnicodeEmoji)
+
+    def test_eq_subclass(self):
+        class MyText(Text):
+            __slots__ = ()
+
+        class MyHeader(Header):
+            __slots__ = ()
+
+        self.assertEqual(MyText("a"), MyText("a"))
+        self.assertNotEqual(MyText("a"), Text("a"))
+        self.assertEqual(MyHeader(Markup([Text("a")]), 1), MyHeader(Markup([Text("a")]), 1))
+        self.assertNotEqual(MyHeader(Markup([Text("a")]), 1), Header(Markup([Text("a")]), 1))
+
+    def test_tuples(self):
+        self.assertEqual(Markup([Text("a")]).nodes, (Text("a"),))
+        self.assertEqual(List(None, [Markup([Text("a")])]).items, (Markup([Text("a")]),))
+
+    def test_contains(self):
+        m = parse("- **<@1>**\n```py\nc```")
+        self.assertTrue(m.contains(Codeblock))
+        self.assertTrue(m.contains(Mention))
+        self.assertTrue(m.contains(UserMention))
+        self.assertFalse(m.contains(RoleMention))
+        self.assertTrue(m.contains(Style))
+        self.assertFalse(m.contains(Italic))
+        self.assertFalse(parse("a").contains(Style))
+        self.assertFalse(EMPTY_MARKUP.contains(Node))
+
+    def test_contains_subclass(self):
+        class Glow(Style):
+            __slots__ = ()
+
+        m = Markup([Glow(Markup([Codeblock("py", "x")]))])
+        self.assertTrue(m.contains(Codeblock))
+        self.assertTrue(m.contains(Glow))
+        self.assertTrue(m.contains(Style))
+        self.assertFalse(m.contains(Bold))
+
+    def test_slots_required(self):
+        with self.assertRaises(TypeError):
+            class Bad(Style):
+                pass
+
+    def test_no_dict(self):
+        m = parse("a **b** *c* __d__ ~~e~~ ||f|| `g` <@1> <#2> <@&3> @everyone @here <:h:4> 🥺 <t:5> https://i [j](https://k)\n# l\n-# m\n> n\n- o\n```py\np```")
+        self.assertEqual(len({type(n) for n in m.walk()}), 21)
+        for n in [m, *m.walk()]:
+            self.assertFalse(hasattr(n, "__dict__"), type(n))
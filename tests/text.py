@@ -27,3 +27,12 @@ class Core(unittest.TestCase):
 
     def test_escape_shrug(self):
         self.assertEqual(parse(r"\¯\_(ツ)_/¯"), Markup([Text(r"¯_(ツ)_/¯")]))
+
+    def test_plain(self):
+        self.assertEqual(parse("just some words, nothing else."), Markup([Text("just some words, nothing else.")]))
+        self.assertEqual(parse("trailing \nspaces"), Markup([Text("trailing\nspaces")]))
+        self.assertEqual(parse("1. a"), Markup([List(1, [Markup([Text("a")])])]))
+
+    def test_precompile(self):
+        precompile()
+        self.assertEqual(parse("# a\n> ```b``` *c*"), Markup([Header(Markup([Text("a")]), 1), Quote(Markup([Codeblock(None, "b"), Text(" "), Italic(Markup([Text("c")]))]))]))
@@ -1,3 +1,4 @@
+import timeit
 import unittest
 
 from parse_discord import *
@@ -50,22 +51,30 @@ class Underscores(unittest.TestCase):
 
     def test_n_on_right(self):
         for i in range(20):
-            p = parse(f"_foo____{'_'*i}")
-            if i % 2:
-                self.assertIsInstance(p.nodes[0], Italic)
-                inner = p.nodes[0].inner.nodes  # type: ignore
-                self.assertEqual(inner[0], Text("foo"))
-                self.assertEqual(depth_of_insanity(inner[1]), i//2 + 1)
-            else:
-                self.assertEqual(p.nodes[0], Text("_foo"))
-                self.assertEqual(depth_of_insanity(p.nodes[1]), i//2 + 1)
+            with self.subTest(i=i):
+                p = parse(f"_foo____{'_'*i}")
+                if i % 2:
+                    self.assertIsInstance(p.nodes[0], Italic)
+                    inner = p.nodes[0].inner.nodes  # type: ignore
+                    self.assertEqual(inner[0], Text("foo"))
+                    self.assertEqual(depth_of_insanity(inner[1]), i//2 + 1)
+                else:
+                    self.assertEqual(p.nodes[0], Text("_foo"))
+                    self.assertEqual(depth_of_insanity(p.nodes[1]), i//2 + 1)
                 
     def test_n(self):
         for i in range(20):
-            p = parse("_"*(i+1))
-            nth, part = divmod(i, 4)
-            self.assertEqual(depth_of_insanity(p.nodes[0]), nth*2+(part//2%2) if part%2 else nth)
-            self.assertIsInstance(p.nodes[0], (Text, Italic if part%2 else Underline))
+            with self.subTest(i=i):
+                p = parse("_"*(i+1))
+                nth, part = divmod(i, 4)
+                self.assertEqual(depth_of_insanity(p.nodes[0]), nth*2+(part//2%2) if part%2 else nth)
+                self.assertIsInstance(p.nodes[0], (Text, Italic if part%2 else Underline))
+
+    def test_n_linear(self):
+        for s in ("_", "__a"):
+            with self.subTest(s=s):
+                short, long = (min(timeit.repeat(lambda: parse(s * (n // len(s))), number=1, repeat=3)) for n in (2000, 4000))
+                self.assertLess(long, short * 3)
 
     def test_no_nest(self):
         self.assertEqual(parse("_a   _b_   c_"), Markup([Text("_a   "), Italic(Markup([Text("b")])), Text("   c_")]))
@@ -4,8 +4,9 @@ import re
 from pathlib import Path
 
 version = sys.argv[1]
+out = Path(__file__).resolve().parent.parent / "parse_discord" / "emoji.txt"
 
-r = requests.get(f"https://raw.githubusercontent.com/mathiasbynens/emoji-test-regex-pattern/main/dist/emoji-{version}/javascript-u.txt").text
+# the pattern is pure ASCII, so it can be rewritten and written out without decoding it
+r = requests.get(f"https://raw.githubusercontent.com/mathiasbynens/emoji-test-regex-pattern/main/dist/emoji-{version}/javascript-u.txt").content
 
-with open(Path(__file__).parent / "../parse_discord/emoji.txt", "w") as f:
-    f.write(re.sub(r"\\u\{(.{5})\}", r"\\U000\1", r))
+out.write_bytes(re.sub(rb"\\u\{([0-9A-Fa-f]{5})\}", rb"\\U000\1", r))